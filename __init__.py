@@ -1,3 +1,4 @@
+import dataclasses
 import json
 import pathlib
 import platform
@@ -62,6 +63,34 @@ def remember_last_args(operator, context, args_location: str):
     return operator
 
 
+_filter_preview_cache = {}
+
+
+def get_filter_preview(data_root: pathlib.Path, filepath: str, filters: importer.ImportFilters) -> list[str]:
+    path = pathlib.Path(filepath)
+    if path.suffix.lower() != '.xml' or not path.is_file():
+        return []
+    key = data_root, path, path.stat().st_mtime, dataclasses.astuple(filters), tuple(importer.IMPORT_RATES.items())
+    if key not in _filter_preview_cache:
+        try:
+            lines = importer.preview_unit(data_root, path, filters)
+        except Exception as e:
+            lines = [f'Cannot preview filters: {e}']
+        _filter_preview_cache.clear()
+        _filter_preview_cache[key] = lines
+    return _filter_preview_cache[key]
+
+
+def draw_mesh_options(operator, layout):
+    for prop in ('new_project', 'scale', 'enable_vertex_automerge', 'vertex_position_merge_threshold'):
+        layout.prop(operator, prop)
+    col = layout.column()
+    col.enabled = not operator.streaming_import  # Streaming import does not generate proxies
+    col.prop(operator, 'generate_proxies')
+    col.prop(operator, 'proxy_resolution')
+    for prop in ('streaming_import', 'streaming_chunk_size', 'memory_budget'):
+        layout.prop(operator, prop)
+
 
 class ImportUnit(bpy.types.Operator, ImportHelper):
     """Import Warhammer 40,000: Gladius - Relics of War unit .xml file"""
@@ -101,6 +130,98 @@ class ImportUnit(bpy.types.Operator, ImportHelper):
         default=0.001, min=0, soft_max=1, precision=3,
     )
 
+    generate_proxies: bpy.props.BoolProperty(
+        name='Generate viewport proxies',
+        description='Display decimated copies of the meshes in the viewport and keep the full meshes for rendering. Not available with streaming import',
+        default=False,
+    )
+
+    proxy_resolution: bpy.props.IntProperty(
+        name='Proxy resolution',
+        description='Number of vertex clusters along the longest side of a proxy mesh',
+        default=32, min=2, soft_max=128,
+    )
+
+    streaming_import: bpy.props.BoolProperty(
+        name='Streaming import',
+        description='Decode mesh vertices in chunks to reduce peak memory usage on very large meshes',
+        default=False,
+    )
+
+    streaming_chunk_size: bpy.props.IntProperty(
+        name='Chunk size',
+        description='Number of triangles decoded at once in streaming import',
+        default=65536, min=1, soft_max=1048576,
+    )
+
+    memory_budget: bpy.props.IntProperty(
+        name='Memory budget (MB)',
+        description="Abort the streaming import if the Python memory it allocates exceeds this. Blender's own mesh data is not counted. 0 means unlimited",
+        default=0, min=0,
+    )
+
+    include_animations: bpy.props.StringProperty(
+        name='Include animations',
+        description='Comma-separated action name patterns to import, e.g. "idle*, attack*". Empty means all',
+    )
+
+    exclude_animations: bpy.props.StringProperty(
+        name='Exclude animations',
+        description='Comma-separated action name patterns to skip',
+    )
+
+    include_weapons: bpy.props.StringProperty(
+        name='Include weapons',
+        description='Comma-separated weapon name patterns to import. Empty means all',
+    )
+
+    exclude_weapons: bpy.props.StringProperty(
+        name='Exclude weapons',
+        description='Comma-separated weapon name patterns to skip',
+    )
+
+    include_suffixes: bpy.props.StringProperty(
+        name='Include suffixes',
+        description='Comma-separated weapon animation suffix patterns to import. Empty means all',
+    )
+
+    exclude_suffixes: bpy.props.StringProperty(
+        name='Exclude suffixes',
+        description='Comma-separated weapon animation suffix patterns to skip',
+    )
+
+    import_transitions: bpy.props.BoolProperty(
+        name='Import Begin/End animations',
+        description='Import Begin and End variants of Move and Levitate animations',
+        default=True,
+    )
+
+    def get_filters(self) -> importer.ImportFilters:
+        return importer.ImportFilters(
+            include_animations=self.include_animations,
+            exclude_animations=self.exclude_animations,
+            include_weapons=self.include_weapons,
+            exclude_weapons=self.exclude_weapons,
+            include_suffixes=self.include_suffixes,
+            exclude_suffixes=self.exclude_suffixes,
+            import_transitions=self.import_transitions,
+        )
+
+    def draw(self, context):
+        layout = self.layout
+        draw_mesh_options(self, layout)
+        box = layout.box()
+        box.label(text='Filters')
+        for prop in (
+            'include_animations', 'exclude_animations',
+            'include_weapons', 'exclude_weapons',
+            'include_suffixes', 'exclude_suffixes',
+            'import_transitions',
+        ):
+            box.prop(self, prop)
+        for line in get_filter_preview(pathlib.Path(get_preferences(context).mod_folder), self.filepath, self.get_filters()):
+            box.label(text=line)
+
     def execute(self, context):
         if self.new_project:
             bpy.ops.wm.read_homefile(app_template='')
@@ -110,12 +231,22 @@ class ImportUnit(bpy.types.Operator, ImportHelper):
         save_args(addon_prefs.last_args, self, 'import_xml',
                   'filepath', 'new_project', 'scale',
                   'enable_vertex_automerge', 'vertex_position_merge_threshold',
+                  'generate_proxies', 'proxy_resolution',
+                  'streaming_import', 'streaming_chunk_size', 'memory_budget',
+                  'include_animations', 'exclude_animations',
+                  'include_weapons', 'exclude_weapons',
+                  'include_suffixes', 'exclude_suffixes',
+                  'import_transitions',
         )
         loader = importer.UnitLoader(
             pathlib.Path(addon_prefs.mod_folder),
             self.scale,
             self.enable_vertex_automerge,
             self.vertex_position_merge_threshold,
+            filters=self.get_filters(),
+            proxy_resolution=self.proxy_resolution if self.generate_proxies and not self.streaming_import else 0,
+            streaming_chunk_size=self.streaming_chunk_size if self.streaming_import else 0,
+            memory_budget=self.memory_budget,
             context=context,
         )
         window = context.window_manager.windows[0]
@@ -128,6 +259,7 @@ class ImportUnit(bpy.types.Operator, ImportHelper):
                         if space.type == 'VIEW_3D':
                             space.shading.type = 'MATERIAL'
             finally:
+                loader.shutdown()
                 for message_lvl, message in loader.messages:
                     self.report({message_lvl}, message)
         return {'FINISHED'}
@@ -171,6 +303,39 @@ class ImportMsh(bpy.types.Operator, ImportHelper):
         default=0.001, min=0, soft_max=1, precision=3,
     )
 
+    generate_proxies: bpy.props.BoolProperty(
+        name='Generate viewport proxies',
+        description='Display decimated copies of the meshes in the viewport and keep the full meshes for rendering. Not available with streaming import',
+        default=False,
+    )
+
+    proxy_resolution: bpy.props.IntProperty(
+        name='Proxy resolution',
+        description='Number of vertex clusters along the longest side of a proxy mesh',
+        default=32, min=2, soft_max=128,
+    )
+
+    streaming_import: bpy.props.BoolProperty(
+        name='Streaming import',
+        description='Decode mesh vertices in chunks to reduce peak memory usage on very large meshes',
+        default=False,
+    )
+
+    streaming_chunk_size: bpy.props.IntProperty(
+        name='Chunk size',
+        description='Number of triangles decoded at once in streaming import',
+        default=65536, min=1, soft_max=1048576,
+    )
+
+    memory_budget: bpy.props.IntProperty(
+        name='Memory budget (MB)',
+        description="Abort the streaming import if the Python memory it allocates exceeds this. Blender's own mesh data is not counted. 0 means unlimited",
+        default=0, min=0,
+    )
+
+    def draw(self, context):
+        draw_mesh_options(self, self.layout)
+
     def execute(self, context):
         if self.new_project:
             bpy.ops.wm.read_homefile(app_template='')
@@ -180,29 +345,59 @@ class ImportMsh(bpy.types.Operator, ImportHelper):
         save_args(addon_prefs.last_args, self, 'import_msh',
                   'filepath', 'new_project', 'scale',
                   'enable_vertex_automerge', 'vertex_position_merge_threshold',
+                  'generate_proxies', 'proxy_resolution',
+                  'streaming_import', 'streaming_chunk_size', 'memory_budget',
         )
         loader = importer.UnitLoader(
             pathlib.Path(addon_prefs.mod_folder),
             self.scale,
             self.enable_vertex_automerge,
             self.vertex_position_merge_threshold,
+            proxy_resolution=self.proxy_resolution if self.generate_proxies and not self.streaming_import else 0,
+            streaming_chunk_size=self.streaming_chunk_size if self.streaming_import else 0,
+            memory_budget=self.memory_budget,
             context=context,
         )
         window = context.window_manager.windows[0]
         with context.temp_override(window=window):
             try:
                 loader.load_msh_file(pathlib.Path(self.filepath))
+                loader.build_proxies()
                 for area in context.screen.areas:
                     if area.type == 'VIEW_3D':
                         space = area.spaces.active
                         if space.type == 'VIEW_3D':
                             space.shading.type = 'MATERIAL'
             finally:
+                loader.shutdown()
                 for message_lvl, message in loader.messages:
                     self.report({message_lvl}, message)
         return {'FINISHED'}
 
 
+def update_collection_proxies(self, context):
+    for obj in self.all_objects:
+        proxy = obj.get('gladius_proxy')
+        if proxy is None:
+            continue
+        obj.hide_viewport = self.gladius_use_proxy
+        proxy.hide_viewport = not self.gladius_use_proxy
+
+
+class COLLECTION_PT_gladius_proxies(bpy.types.Panel):
+    bl_label = 'Gladius Proxies'
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = 'collection'
+
+    @classmethod
+    def poll(cls, context):
+        return context.collection is not None
+
+    def draw(self, context):
+        self.layout.prop(context.collection, 'gladius_use_proxy')
+
+
 def import_unit_menu_func(self, context):
     op = self.layout.operator(ImportUnit.bl_idname, text='Gladius Unit (.xml)')
     remember_last_args(op, context, 'import_xml')
@@ -217,6 +412,13 @@ def register():
     bpy.utils.register_class(AddonPreferences)
     bpy.utils.register_class(ImportUnit)
     bpy.utils.register_class(ImportMsh)
+    bpy.utils.register_class(COLLECTION_PT_gladius_proxies)
+    bpy.types.Collection.gladius_use_proxy = bpy.props.BoolProperty(
+        name='Use viewport proxies',
+        description='Display decimated proxies of imported meshes in the viewport instead of the full meshes',
+        default=True,
+        update=update_collection_proxies,
+    )
     bpy.types.TOPBAR_MT_file_import.append(import_unit_menu_func)
     bpy.types.TOPBAR_MT_file_import.append(import_msh_menu_func)
 
@@ -224,6 +426,8 @@ def register():
 def unregister():
     bpy.types.TOPBAR_MT_file_import.remove(import_msh_menu_func)
     bpy.types.TOPBAR_MT_file_import.remove(import_unit_menu_func)
+    del bpy.types.Collection.gladius_use_proxy
+    bpy.utils.unregister_class(COLLECTION_PT_gladius_proxies)
     bpy.utils.unregister_class(ImportMsh)
     bpy.utils.unregister_class(ImportUnit)
     bpy.utils.unregister_class(AddonPreferences)
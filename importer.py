@@ -1,11 +1,17 @@
+import array
+import concurrent.futures
 import dataclasses
+import fnmatch
 import pathlib
 import math
 import struct
+import time
+import tracemalloc
 import xml.etree.ElementTree as ET
 
 import bpy
 import mathutils
+import numpy
 
 
 class StopParsing(Exception): ...
@@ -37,6 +43,289 @@ class VertexData:
     bone_ids: list[int] = dataclasses.field(default_factory=lambda: [0] * 4)
 
 
+def parse_patterns(patterns: str) -> list[str]:
+    return [p.strip().lower() for p in patterns.split(',') if p.strip()]
+
+
+def match_patterns(name: str, include: str, exclude: str) -> bool:
+    name = name.lower()
+    include_patterns = parse_patterns(include)
+    if include_patterns and not any(fnmatch.fnmatchcase(name, p) for p in include_patterns):
+        return False
+    return not any(fnmatch.fnmatchcase(name, p) for p in parse_patterns(exclude))
+
+
+@dataclasses.dataclass
+class ImportFilters:
+    """Comma-separated glob patterns (case-insensitive) selecting the unit parts to import.
+    Empty include list means everything."""
+    include_animations: str = ''
+    exclude_animations: str = ''
+    include_weapons: str = ''
+    exclude_weapons: str = ''
+    include_suffixes: str = ''
+    exclude_suffixes: str = ''
+    import_transitions: bool = True
+
+    def animation_allowed(self, name: str) -> bool:
+        return match_patterns(name, self.include_animations, self.exclude_animations)
+
+    def weapon_allowed(self, name: str) -> bool:
+        return match_patterns(name, self.include_weapons, self.exclude_weapons)
+
+    def suffix_allowed(self, suffix: str) -> bool:
+        return match_patterns(suffix, self.include_suffixes, self.exclude_suffixes)
+
+
+# Seconds per byte measured during the last unit import, used to estimate the time saved by filters
+IMPORT_RATES: dict[str, float] = {}
+
+
+def file_size(path: pathlib.Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def texture_paths(data_root: pathlib.Path, xml_root: ET.Element) -> list[pathlib.Path]:
+    return [
+        data_root / 'Video/Textures' / f'{tex.get("name")}.dds'
+        for tex in xml_root.find('textures').iterfind('texture')
+        if tex.get('name') != 'ShadowMapColor'
+    ]
+
+
+def material_files(data_root: pathlib.Path, material_path: pathlib.Path) -> list[pathlib.Path]:
+    """Material .xml file and the textures it loads."""
+    xml_path = material_path.with_suffix('.xml')
+    try:
+        return [xml_path, *texture_paths(data_root, ET.parse(xml_path).getroot())]
+    except (OSError, ET.ParseError, AttributeError):
+        return [xml_path]
+
+
+@dataclasses.dataclass
+class UnitPlan:
+    # mesh, material, parent bone, animations loaded right after the mesh
+    meshes: list[tuple[pathlib.Path, pathlib.Path, str | None, list[tuple[str, pathlib.Path]]]] = dataclasses.field(default_factory=list)
+    animations: list[tuple[str, pathlib.Path]] = dataclasses.field(default_factory=list)
+    # reason -> [(kind, path)], materials are listed once and expand to their textures in the summary
+    skipped: dict[str, list[tuple[str, pathlib.Path]]] = dataclasses.field(default_factory=dict)
+
+    def skip(self, reason: str, kind: str, path: pathlib.Path):
+        self.skipped.setdefault(reason, []).append((kind, path))
+
+    def summary(self, data_root: pathlib.Path) -> list[str]:
+        def describe(files: list[tuple[str, pathlib.Path]]) -> str:
+            files = [
+                (kind, file_path)
+                for kind, path in files
+                for file_path in (material_files(data_root, path) if kind == 'material' else [path])
+            ]
+            size = sum(file_size(p) for _, p in files)
+            res = f'{len(files)} files, {size / 2**20:.2f} MB'
+            if all(kind in IMPORT_RATES for kind, _ in files):
+                seconds = sum(file_size(p) * IMPORT_RATES[kind] for kind, p in files)
+                res += f', ~{seconds:.1f} s'
+            return res
+
+        imported = [('mesh', p) for p, *_ in self.meshes]
+        imported.extend(('material', p) for _, p, *_ in self.meshes)
+        imported.extend(('animation', p) for *_, animations in self.meshes for _, p in animations)
+        imported.extend(('animation', p) for _, p in self.animations)
+        lines = [f'Import: {describe(imported)}']
+        for reason, files in self.skipped.items():
+            lines.append(f'Skip {reason}: {describe(files)}')
+        return lines
+
+
+def animation_files(data_root: pathlib.Path, name: str, filename: str, count: int | str = None, suffix: str = '') -> list[tuple[str, pathlib.Path]]:
+    if count is None or int(count) == 1:
+        return [(f'{name}{suffix}', data_root / 'Video/Animations' / f'{filename}{suffix}.anm')]
+    return [
+        (f'{name}{suffix}{idx}', data_root / 'Video/Animations' / f'{filename}{idx}{suffix}.anm')
+        for idx in range(int(count))
+    ]
+
+
+def plan_unit(data_root: pathlib.Path, root: ET.Element, filters: ImportFilters) -> UnitPlan:
+    """Decide which files a unit import reads without opening any of them."""
+    plan = UnitPlan()
+    animation_entries = []  # (name, path, count, skip reason, index of the mesh to load it after)
+    all_animations = {}  # path -> latest entry
+    animation_suffixes = {}  # suffix -> skip reason
+
+    def add_animations(name: str, path: str, count, reason: str, mesh_idx: int = None):
+        if reason is None and not filters.animation_allowed(name):
+            reason = 'animations'
+        previous = all_animations.get(path)
+        if previous is not None and previous[3] is not None:
+            animation_entries.remove(previous)
+        entry = name, path, count, reason, mesh_idx
+        animation_entries.append(entry)
+        all_animations[path] = entry
+
+    for unit in root.find('model'):
+        plan.meshes.append((
+            (data_root / 'Video/Meshes' / unit.get('mesh')).with_suffix('.msh'),
+            data_root / 'Video/Materials' / unit.get('material'),
+            None,
+            [],
+        ))
+        idle_animation_path = unit.get('idleAnimation')
+        if idle_animation_path:
+            add_animations('idle', idle_animation_path, unit.get('idleAnimationCount'), None, len(plan.meshes) - 1)
+    for weapons in root.iterfind('weapons'):
+        for weapon in weapons.iterfind('weapon'):
+            for model in weapon.iterfind('model'):
+                for weapon_type in model:
+                    material_path = weapon_type.get('material')
+                    mesh_path = weapon_type.get('mesh')
+                    if not (mesh_path and material_path):
+                        continue
+                    full_mesh_path = (data_root / 'Video/Meshes' / mesh_path).with_suffix('.msh')
+                    animation_suffix = weapon_type.get('animationSuffix')
+                    if not filters.weapon_allowed(weapon.get('name', mesh_path)):
+                        plan.skip('weapons', 'mesh', full_mesh_path)
+                        plan.skip('weapons', 'material', data_root / 'Video/Materials' / material_path)
+                        if animation_suffix:
+                            animation_suffixes.setdefault(animation_suffix, 'weapons')
+                        continue
+                    plan.meshes.append((
+                        full_mesh_path,
+                        data_root / 'Video/Materials' / material_path,
+                        weapon_type.get('bone') or None,
+                        [],
+                    ))
+                    if animation_suffix:
+                        animation_suffixes[animation_suffix] = None if filters.suffix_allowed(animation_suffix) else 'suffixes'
+    for actions_root in root.iterfind('actions'):
+        for action in actions_root:
+            for model in action.iterfind('model'):
+                extra_actions = []
+                for action_inner in model.iterfind('action'):
+                    for key, animation_path in action_inner.attrib.items():
+                        if not key.lower().endswith('animation'):
+                            continue
+                        suffix = key[:-len('animation')]
+                        animation_name, animation_count = f'{action.tag}{suffix[:1].upper()}{suffix[1:]}', action_inner.get(f'{key}Count')
+                        if animation_path in all_animations and (
+                            all_animations[animation_path][3] is None
+                            or not filters.animation_allowed(animation_name)
+                        ):
+                            continue
+                        add_animations(animation_name, animation_path, animation_count, None)
+                        for suffix in ('Move', 'Levitate'):
+                            if animation_path.lower().endswith(suffix.lower()):
+                                extra_actions.append((f'{animation_name}Begin', f'{animation_path}Begin', 1))
+                                extra_actions.append((f'{animation_name}End', f'{animation_path}End', 1))
+                                break
+                for anim_name, anim_path, animation_count in extra_actions:
+                    if not (data_root / 'Video/Animations' / f'{anim_path}.anm').exists():
+                        continue
+                    add_animations(anim_name, anim_path, animation_count, None if filters.import_transitions else 'transitions')
+
+    for name, path, cnt, reason, mesh_idx in animation_entries:
+        for anim_name, anim_path in animation_files(data_root, name, path, cnt):
+            if reason is not None:
+                plan.skip(reason, 'animation', anim_path)
+            elif mesh_idx is not None:
+                plan.meshes[mesh_idx][3].append((anim_name, anim_path))
+            else:
+                plan.animations.append((anim_name, anim_path))
+    for suffix, suffix_reason in animation_suffixes.items():
+        for name, path, cnt, anim_reason, _ in all_animations.values():
+            reason = suffix_reason or anim_reason
+            for anim_name, anim_path in animation_files(data_root, name, path, cnt, suffix=suffix):
+                if reason is None:
+                    plan.animations.append((anim_name, anim_path))
+                else:
+                    plan.skip(reason, 'animation', anim_path)
+    return plan
+
+
+def preview_unit(data_root: pathlib.Path, filepath: pathlib.Path, filters: ImportFilters) -> list[str]:
+    root = ET.parse(filepath).getroot()
+    if root.tag != 'unit':
+        return []
+    return plan_unit(data_root, root, filters).summary(data_root)
+
+
+@dataclasses.dataclass
+class ProxyData:
+    positions: numpy.ndarray  # (n, 3) float32
+    faces: numpy.ndarray  # (n, 3) int32
+    face_sources: numpy.ndarray  # index of the original face, used to copy UVs
+    representatives: numpy.ndarray  # index of the original vertex, used to copy bone weights
+    uvs: numpy.ndarray  # 2 floats per face corner
+
+
+# Decimated proxies of already imported meshes, keyed by file and placement
+PROXY_CACHE: dict[tuple, ProxyData] = {}
+PROXY_CACHE_SIZE = 64
+
+
+def build_proxy(positions: numpy.ndarray, faces: numpy.ndarray, uvs: numpy.ndarray, resolution: int) -> ProxyData:
+    """Decimate a mesh by clustering its vertices on a grid with `resolution` cells along the longest side.
+    Vectorized with numpy, which releases the GIL, so it can run in a worker thread alongside the import."""
+    if not len(positions) or not len(faces):
+        return ProxyData(
+            numpy.zeros((0, 3), numpy.float32), numpy.zeros((0, 3), numpy.int32),
+            numpy.zeros(0, numpy.int64), numpy.zeros(0, numpy.int64), numpy.zeros(0, numpy.float32),
+        )
+    lo = positions.min(axis=0)
+    cell_size = float((positions.max(axis=0) - lo).max()) / resolution or 1.0
+    cells = ((positions - lo) / cell_size).astype(numpy.int64)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, representatives, remap = numpy.unique(keys, return_index=True, return_inverse=True)
+    remap = remap.reshape(-1)
+    counts = numpy.bincount(remap)
+    cluster_positions = numpy.stack(
+        [numpy.bincount(remap, weights=positions[:, i]) / counts for i in range(3)], axis=1,
+    ).astype(numpy.float32)
+
+    new_faces = remap[faces]
+    valid = (
+        (new_faces[:, 0] != new_faces[:, 1])
+        & (new_faces[:, 1] != new_faces[:, 2])
+        & (new_faces[:, 2] != new_faces[:, 0])
+    )
+    face_sources = numpy.flatnonzero(valid)
+    _, first_faces = numpy.unique(numpy.sort(new_faces[face_sources], axis=1), axis=0, return_index=True)
+    face_sources = face_sources[numpy.sort(first_faces)]
+    return ProxyData(
+        positions=cluster_positions,
+        faces=new_faces[face_sources].astype(numpy.int32),
+        face_sources=face_sources,
+        representatives=representatives,
+        uvs=uvs.reshape(-1, 6)[face_sources].reshape(-1),
+    )
+
+
+def fill_mesh(mesh, positions: numpy.ndarray, faces: numpy.ndarray):
+    """Fill an empty mesh with triangles without going through Python lists."""
+    mesh.vertices.add(len(positions))
+    mesh.vertices.foreach_set('co', numpy.ascontiguousarray(positions, numpy.float32).reshape(-1))
+    mesh.loops.add(len(faces) * 3)
+    mesh.loops.foreach_set('vertex_index', numpy.ascontiguousarray(faces, numpy.int32).reshape(-1))
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set('loop_start', numpy.arange(0, len(faces) * 3, 3, dtype=numpy.int32))
+    mesh.update(calc_edges=True)
+    mesh.shade_smooth()
+
+
+@dataclasses.dataclass
+class StreamedMesh:
+    positions: array.array  # 3 floats per vertex
+    skin_ids: array.array  # index into skins per vertex
+    skins: list[tuple[tuple[int, ...], tuple[float, ...]]]  # bone ids and weights
+    faces: array.array  # 3 vertex indices per face
+    corner_normals: array.array  # 3 floats per face corner
+    uvs: array.array  # 2 floats per face corner
+
+
 class UnitLoader:
     def __init__(
         self,
@@ -46,6 +335,10 @@ class UnitLoader:
         vertex_position_merge_threshold: float = 0.001,
         vertex_normal_merge_threshold: float = 1.99,
         vertex_weight_merge_threshold: float = 0.01,
+        filters: ImportFilters = None,
+        proxy_resolution: int = 0,
+        streaming_chunk_size: int = 0,
+        memory_budget: int = 0,
         context=None,
     ):
         self.data_root = data_root
@@ -54,6 +347,14 @@ class UnitLoader:
         self.vertex_position_merge_threshold = vertex_position_merge_threshold
         self.vertex_normal_merge_threshold = vertex_normal_merge_threshold
         self.vertex_weight_merge_threshold = vertex_weight_merge_threshold
+        self.filters = filters if filters is not None else ImportFilters()
+        self.proxy_resolution = proxy_resolution
+        self.proxy_executor = None  # created on the first proxy to decimate
+        self.proxy_futures = {}  # cache key -> decimation result, shared by repeated meshes
+        self.pending_proxies = []
+        self.streaming_chunk_size = streaming_chunk_size  # triangles per chunk, 0 to decode the whole vertex block at once
+        self.memory_budget = memory_budget  # MB, 0 for unlimited
+        self._memory_baseline = 0
 
         self.bpy_context = context
         if self.bpy_context is None:
@@ -85,10 +386,7 @@ class UnitLoader:
         links = mat.node_tree.links
         node_final = mat.node_tree.nodes[0]
         textures = {}
-        for tex in xml_root.find('textures').iterfind('texture'):
-            if tex.get('name') == 'ShadowMapColor':
-                continue
-            texture_path = self.data_root / 'Video/Textures' / f'{tex.get("name")}.dds'
+        for texture_path in texture_paths(self.data_root, xml_root):
             image = bpy.data.images.load(str(texture_path))
             image.pack()
             if texture_path.stem.endswith('Diffuse'):
@@ -136,10 +434,6 @@ class UnitLoader:
 
         return mat
 
-    def load_mesh(self, filename: str, *args, **kwargs):
-        full_path = self.data_root / 'Video/Meshes' / filename
-        return self.load_msh_file(full_path.with_suffix('.msh'), *args, **kwargs)
-
     def load_msh_file(self, filepath: pathlib.Path, material=None, parent_bone=None, apply_scale: bool = False):
         delta = mathutils.Matrix.Rotation(math.radians(-90.0), 4, 'Z')  # Fix bone rotation
         if parent_bone is None:
@@ -190,93 +484,17 @@ class UnitLoader:
             assert vertex_cnt % 3 == 0, f'{data_size=} {vertex_info_size=}'
             poly_cnt = vertex_cnt // 3
 
-            face_list = []
-            face_uv_list = []
-
-            vertex_list: list[VertexData] = []
-            for poly_idx in range(poly_cnt):
-                face_vertices = []
-                for idx in range(3):
-                    vertex_data = {k: read_struct(f'<{v}f', f) for k, v in vertex_layout.items()}
-                    vertex_item = VertexData(
-                        position=(global_matrix @ mathutils.Vector(vertex_data['vertexPosition'])).freeze(),
-                        normal=(global_matrix @ mathutils.Vector(vertex_data.get('vertexNormal', (0, 0, 0)))).freeze(),
-                    )
-                    for bone_idx, bone_weight in sorted(zip(vertex_data.get('vertexBoneIndices', []), vertex_data.get('vertexBoneWeights', []))):
-                        if bone_weight == 0:
-                            continue
-                        vertex_item.bone_ids.append(bone_idx)
-                        vertex_item.bone_weights.append(bone_weight)
-                    face_vertices.append(len(vertex_list))
-                    vertex_list.append(vertex_item)
-                    u, v = vertex_data.get('vertexTextureCoordinate', (0, 0))
-                    face_uv_list.append((u, 1 - v))
-                face_list.append(face_vertices)
-
-            if self.enable_vertex_automerge:
-                vertex_kd = mathutils.kdtree.KDTree(vertex_cnt)
-                for idx, v in enumerate(vertex_list):
-                    vertex_kd.insert(v.position, idx)
-                vertex_kd.balance()
-                vertex_group_by_postition = {}
-                seen_data = {}
-                idx2merged = []
-                merged_vert_ids = []
-                for orig_vertex_idx, v in enumerate(vertex_list):
-                    for (co, index, dist) in vertex_kd.find_range(v.position, self.vertex_position_merge_threshold):
-                        if index == orig_vertex_idx:
-                            continue
-                        if index in vertex_group_by_postition:
-                            vertex_group_key = vertex_group_by_postition[index]
-                            break
-                    else:
-                        vertex_group_key = vertex_group_by_postition[orig_vertex_idx] = orig_vertex_idx
-                    seen_vertex_data = seen_data.setdefault(vertex_group_key, [])
-                    vertex_normal = v.normal
-                    bone_ids = tuple(v.bone_ids)
-                    bone_weights = mathutils.Vector(v.bone_weights).to_4d()
-                    vertex_idx = None
-                    for idx, other_normal, other_bone_ids, other_bone_weights in seen_vertex_data:
-                        if (
-                            (other_normal - vertex_normal).length < self.vertex_normal_merge_threshold
-                            and bone_ids == other_bone_ids
-                            and (bone_weights - other_bone_weights).length < self.vertex_weight_merge_threshold
-                        ):
-                            vertex_idx = idx
-                            break
-                    if vertex_idx is None:
-                        vertex_idx = len(merged_vert_ids)
-                        seen_vertex_data.append((vertex_idx, vertex_normal, bone_ids, bone_weights))
-                        merged_vert_ids.append(orig_vertex_idx)
-                    idx2merged.append(vertex_idx)
-                old_face_list = face_list
-                face_list = []
-                uv_array =  face_uv_list
-                face_uv_list = []
-                seen_faces = set()
-                vertex_normals = []
-                for face in old_face_list:
-                    new_face = [idx2merged[i] for i in face]
-                    if not (new_face[0] != new_face[1] != new_face[2] != new_face[0]):
-                        continue
-                    f_key = tuple(sorted(new_face))
-                    if f_key in seen_faces:
-                        continue
-                    seen_faces.add(f_key)
-                    face_list.append(new_face)
-                    face_uv_list.extend(uv_array[i] for i in face)
-                    vertex_normals.extend(vertex_list[i].normal for i in face)
-                vertex_list = [vertex_list[i] for i in merged_vert_ids]
-                del uv_array
+            proxy_key = None
+            if self.proxy_resolution and not self.streaming_chunk_size:
+                proxy_key = self.proxy_cache_key(filepath, global_matrix)
+            if self.streaming_chunk_size:
+                new_mesh, bone_ids, bone_weights, proxy_args = self.read_mesh_streaming(
+                    f, filepath, vertex_layout, poly_cnt, global_matrix)
             else:
-                vertex_normals = [vertex_list[v].normal for p in face_list for v in p]
-
-            new_mesh = bpy.data.meshes.new(filepath.stem)
-            new_mesh.from_pydata([v.position for v in vertex_list], [], face_list, shade_flat=False)
-            new_mesh.normals_split_custom_set(vertex_normals)
-
-            uv_layer = new_mesh.uv_layers.new()
-            uv_layer.data.foreach_set('uv', [i for p in face_uv_list for i in p])
+                new_mesh, bone_ids, bone_weights, proxy_args = self.read_mesh(
+                    f, filepath, vertex_layout, poly_cnt, vertex_cnt, global_matrix,
+                    proxy_inputs=proxy_key is not None and not self.has_proxy(proxy_key),
+                )
 
             if material is not None:
                 new_mesh.materials.append(material)
@@ -285,23 +503,11 @@ class UnitLoader:
             obj = bpy.data.objects.new(filepath.stem, new_mesh)
             obj.parent = self.armature_obj
 
-            vertex_groups = {}
-            for vertex_idx, v in enumerate(vertex_list):
-                for bone_idx, bone_weight in zip(v.bone_ids, v.bone_weights):
-                    bone_name = bone_names[int(bone_idx)]
-                    vertex_groups.setdefault(bone_name, []).append((vertex_idx, bone_weight))
-
-            for bone_name in created_bones:
-                vertex_group = obj.vertex_groups.new(name=bone_name)
-                weight_info = vertex_groups.get(bone_name)
-                if weight_info is None:
-                    continue
-                for vertex_idx, bone_weight in weight_info:
-                    vertex_group.add([vertex_idx], bone_weight, 'REPLACE')
-            
-            armature_mod = obj.modifiers.new('Skeleton', 'ARMATURE')
-            armature_mod.object = self.armature_obj
+            self.add_skin(obj, bone_names, created_bones, bone_ids, bone_weights)
             bpy.data.collections['Collection'].objects.link(obj)
+            if proxy_key is not None:
+                self.queue_proxy(proxy_key, proxy_args, bone_ids, bone_weights, obj, bone_names, created_bones)
+            del bone_ids, bone_weights, proxy_args
             if has_bbox:
                 bbox = bpy.data.objects.new(bbox_name, None)
                 bbox.empty_display_type = 'CUBE'
@@ -313,12 +519,349 @@ class UnitLoader:
                 bbox.parent = obj
                 bpy.data.collections['Collection'].objects.link(bbox)
 
-    def load_animations(self, name: str, filename: str, count: int | str = None, suffix: str = ''):
-        if count is None or int(count) == 1:
-            self.load_anm_file(f'{name}{suffix}', self.data_root / 'Video/Animations' / f'{filename}{suffix}.anm')
+    def read_mesh(self, f, filepath: pathlib.Path, vertex_layout: dict[str, int], poly_cnt: int, vertex_cnt: int, global_matrix, proxy_inputs: bool = False):
+        face_list = []
+        face_uv_list = []
+
+        vertex_list: list[VertexData] = []
+        for poly_idx in range(poly_cnt):
+            face_vertices = []
+            for idx in range(3):
+                vertex_data = {k: read_struct(f'<{v}f', f) for k, v in vertex_layout.items()}
+                vertex_item = VertexData(
+                    position=(global_matrix @ mathutils.Vector(vertex_data['vertexPosition'])).freeze(),
+                    normal=(global_matrix @ mathutils.Vector(vertex_data.get('vertexNormal', (0, 0, 0)))).freeze(),
+                )
+                for bone_idx, bone_weight in sorted(zip(vertex_data.get('vertexBoneIndices', []), vertex_data.get('vertexBoneWeights', []))):
+                    if bone_weight == 0:
+                        continue
+                    vertex_item.bone_ids.append(bone_idx)
+                    vertex_item.bone_weights.append(bone_weight)
+                face_vertices.append(len(vertex_list))
+                vertex_list.append(vertex_item)
+                u, v = vertex_data.get('vertexTextureCoordinate', (0, 0))
+                face_uv_list.append((u, 1 - v))
+            face_list.append(face_vertices)
+
+        if self.enable_vertex_automerge:
+            vertex_kd = mathutils.kdtree.KDTree(vertex_cnt)
+            for idx, v in enumerate(vertex_list):
+                vertex_kd.insert(v.position, idx)
+            vertex_kd.balance()
+            vertex_group_by_postition = {}
+            seen_data = {}
+            idx2merged = []
+            merged_vert_ids = []
+            for orig_vertex_idx, v in enumerate(vertex_list):
+                for (co, index, dist) in vertex_kd.find_range(v.position, self.vertex_position_merge_threshold):
+                    if index == orig_vertex_idx:
+                        continue
+                    if index in vertex_group_by_postition:
+                        vertex_group_key = vertex_group_by_postition[index]
+                        break
+                else:
+                    vertex_group_key = vertex_group_by_postition[orig_vertex_idx] = orig_vertex_idx
+                seen_vertex_data = seen_data.setdefault(vertex_group_key, [])
+                vertex_normal = v.normal
+                bone_ids = tuple(v.bone_ids)
+                bone_weights = mathutils.Vector(v.bone_weights).to_4d()
+                vertex_idx = None
+                for idx, other_normal, other_bone_ids, other_bone_weights in seen_vertex_data:
+                    if (
+                        (other_normal - vertex_normal).length < self.vertex_normal_merge_threshold
+                        and bone_ids == other_bone_ids
+                        and (bone_weights - other_bone_weights).length < self.vertex_weight_merge_threshold
+                    ):
+                        vertex_idx = idx
+                        break
+                if vertex_idx is None:
+                    vertex_idx = len(merged_vert_ids)
+                    seen_vertex_data.append((vertex_idx, vertex_normal, bone_ids, bone_weights))
+                    merged_vert_ids.append(orig_vertex_idx)
+                idx2merged.append(vertex_idx)
+            old_face_list = face_list
+            face_list = []
+            uv_array =  face_uv_list
+            face_uv_list = []
+            seen_faces = set()
+            vertex_normals = []
+            for face in old_face_list:
+                new_face = [idx2merged[i] for i in face]
+                if not (new_face[0] != new_face[1] != new_face[2] != new_face[0]):
+                    continue
+                f_key = tuple(sorted(new_face))
+                if f_key in seen_faces:
+                    continue
+                seen_faces.add(f_key)
+                face_list.append(new_face)
+                face_uv_list.extend(uv_array[i] for i in face)
+                vertex_normals.extend(vertex_list[i].normal for i in face)
+            vertex_list = [vertex_list[i] for i in merged_vert_ids]
+            del uv_array
         else:
-            for idx in range(int(count)):
-                self.load_anm_file(f'{name}{suffix}{idx}', self.data_root / 'Video/Animations' / f'{filename}{idx}{suffix}.anm')
+            vertex_normals = [vertex_list[v].normal for p in face_list for v in p]
+
+        new_mesh = bpy.data.meshes.new(filepath.stem)
+        new_mesh.from_pydata([v.position for v in vertex_list], [], face_list, shade_flat=False)
+        new_mesh.normals_split_custom_set(vertex_normals)
+
+        uvs = [i for p in face_uv_list for i in p]
+        uv_layer = new_mesh.uv_layers.new()
+        uv_layer.data.foreach_set('uv', uvs)
+
+        bone_ids = [v.bone_ids for v in vertex_list]
+        bone_weights = [v.bone_weights for v in vertex_list]
+        proxy_args = ()
+        if proxy_inputs:
+            proxy_args = (
+                numpy.array([v.position for v in vertex_list], numpy.float32).reshape(-1, 3),
+                numpy.array(face_list, numpy.int32).reshape(-1, 3),
+                numpy.array(uvs, numpy.float32),
+            )
+        return new_mesh, bone_ids, bone_weights, proxy_args
+
+    def read_mesh_streaming(self, f, filepath: pathlib.Path, vertex_layout: dict[str, int], poly_cnt: int, global_matrix):
+        """Read the vertex block in chunks of `streaming_chunk_size` triangles,
+        merging vertices into compact arrays as they are decoded."""
+        # Python allocations are measured with tracemalloc, which also sees the numpy arrays
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._memory_baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            streamed = self.read_vertices_streaming(f, filepath, vertex_layout, poly_cnt, global_matrix)
+
+            new_mesh = bpy.data.meshes.new(filepath.stem)
+            fill_mesh(
+                new_mesh,
+                numpy.frombuffer(streamed.positions, numpy.float32).reshape(-1, 3),
+                numpy.frombuffer(streamed.faces, numpy.int32).reshape(-1, 3),
+            )
+            streamed.positions = streamed.faces = None
+            new_mesh.normals_split_custom_set(numpy.frombuffer(streamed.corner_normals, numpy.float32).reshape(-1, 3))
+            streamed.corner_normals = None
+
+            uv_layer = new_mesh.uv_layers.new()
+            uv_layer.data.foreach_set('uv', streamed.uvs)
+            streamed.uvs = None
+            self.check_memory_budget(filepath)
+            self.messages.append(('INFO', f'{filepath.name}: peak import memory {self.traced_memory() / 2**20:.1f} MB'))
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        skins = streamed.skins
+        bone_ids = (skins[i][0] for i in streamed.skin_ids)
+        bone_weights = (skins[i][1] for i in streamed.skin_ids)
+        if self.proxy_resolution:
+            self.messages.append(('WARNING', f'Viewport proxies are not generated for {filepath.name} in streaming import'))
+        return new_mesh, bone_ids, bone_weights, ()
+
+    def read_vertices_streaming(self, f, filepath: pathlib.Path, vertex_layout: dict[str, int], poly_cnt: int, global_matrix) -> StreamedMesh:
+        attributes = {}
+        offset = 0
+        for k, v in vertex_layout.items():
+            attributes[k] = offset, offset + v
+            offset += v
+        vertex_struct = struct.Struct(f'<{offset}f')
+        chunk_polys = self.streaming_chunk_size
+        self.check_memory_budget(filepath, chunk_polys * 3 * vertex_struct.size)
+
+        def attribute(values, name, default):
+            if name not in attributes:
+                return default
+            return values[slice(*attributes[name])]
+
+        positions = array.array('f')
+        vertex_normals = array.array('f')
+        skin_ids = array.array('i')
+        skins = {}
+        skin_list = []
+        faces = array.array('i')
+        corner_normals = array.array('f')
+        uvs = array.array('f')
+        threshold = self.vertex_position_merge_threshold
+        cell_size = threshold if threshold > 0 else 1e-6
+        leader_cells = {}  # grid cell -> merged indices of vertices that started a position group
+        group_members = {}  # group leader -> merged indices sharing its position
+        seen_faces = set()
+        neighbours = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)]
+
+        def add_vertex(pos, normal, skin_id) -> int:
+            vertex_idx = len(skin_ids)
+            positions.extend(pos)
+            vertex_normals.extend(normal)
+            skin_ids.append(skin_id)
+            return vertex_idx
+
+        def merge_vertex(pos, normal, skin_id) -> int:
+            cell = tuple(math.floor(c / cell_size) for c in pos)
+            leader = None
+            for dx, dy, dz in neighbours:
+                for candidate in leader_cells.get((cell[0] + dx, cell[1] + dy, cell[2] + dz), ()):
+                    if math.dist(positions[candidate * 3:candidate * 3 + 3], pos) <= threshold:
+                        leader = candidate
+                        break
+                if leader is not None:
+                    break
+            if leader is None:
+                vertex_idx = add_vertex(pos, normal, skin_id)
+                leader_cells.setdefault(cell, []).append(vertex_idx)
+                group_members[vertex_idx] = [vertex_idx]
+                return vertex_idx
+            bone_ids, bone_weights = skin_list[skin_id]
+            for other_idx in group_members[leader]:
+                other_bone_ids, other_bone_weights = skin_list[skin_ids[other_idx]]
+                # Same criteria as read_mesh, which compares only the first four weight slots
+                if (
+                    math.dist(vertex_normals[other_idx * 3:other_idx * 3 + 3], normal) < self.vertex_normal_merge_threshold
+                    and bone_ids == other_bone_ids
+                    and math.dist(bone_weights[:4], other_bone_weights[:4]) < self.vertex_weight_merge_threshold
+                ):
+                    return other_idx
+            vertex_idx = add_vertex(pos, normal, skin_id)
+            group_members[leader].append(vertex_idx)
+            return vertex_idx
+
+        for chunk_start in range(0, poly_cnt, chunk_polys):
+            chunk = f.read(min(chunk_polys, poly_cnt - chunk_start) * 3 * vertex_struct.size)
+            face = []
+            face_normals = []
+            face_uvs = []
+            for values in vertex_struct.iter_unpack(chunk):
+                pos = tuple(global_matrix @ mathutils.Vector(attribute(values, 'vertexPosition', None)))
+                normal = tuple(global_matrix @ mathutils.Vector(attribute(values, 'vertexNormal', (0, 0, 0))))
+                skin = sorted(
+                    (int(bone_idx), bone_weight)
+                    for bone_idx, bone_weight in zip(attribute(values, 'vertexBoneIndices', ()), attribute(values, 'vertexBoneWeights', ()))
+                    if bone_weight != 0
+                )
+                # Keep the four zero placeholders of VertexData so both import paths produce the same skin
+                skin = (0,) * 4 + tuple(i for i, _ in skin), (0.0,) * 4 + tuple(w for _, w in skin)
+                skin_id = skins.get(skin)
+                if skin_id is None:
+                    skin_id = skins[skin] = len(skin_list)
+                    skin_list.append(skin)
+                if self.enable_vertex_automerge:
+                    face.append(merge_vertex(pos, normal, skin_id))
+                else:
+                    face.append(add_vertex(pos, normal, skin_id))
+                face_normals.extend(normal)
+                u, v = attribute(values, 'vertexTextureCoordinate', (0, 0))
+                face_uvs.extend((u, 1 - v))
+                if len(face) < 3:
+                    continue
+                keep_face = True
+                if self.enable_vertex_automerge:
+                    a, b, c = sorted(face)
+                    f_key = (a * poly_cnt * 3 + b) * poly_cnt * 3 + c
+                    keep_face = a != b != c and f_key not in seen_faces
+                    seen_faces.add(f_key)
+                if keep_face:
+                    faces.extend(face)
+                    corner_normals.extend(face_normals)
+                    uvs.extend(face_uvs)
+                face, face_normals, face_uvs = [], [], []
+            del chunk
+            self.check_memory_budget(filepath)
+        del vertex_normals, skins, leader_cells, group_members, seen_faces
+        return StreamedMesh(
+            positions=positions,
+            skin_ids=skin_ids,
+            skins=skin_list,
+            faces=faces,
+            corner_normals=corner_normals,
+            uvs=uvs,
+        )
+
+    def traced_memory(self) -> int:
+        """Peak Python memory allocated since the streaming import of the current mesh started."""
+        return tracemalloc.get_traced_memory()[1] - self._memory_baseline
+
+    def check_memory_budget(self, filepath: pathlib.Path, size: int = None):
+        if size is None:
+            size = self.traced_memory()
+        if self.memory_budget and size > self.memory_budget * 2**20:
+            self.messages.append(('ERROR', f'Importing {filepath} needs more than the memory budget of {self.memory_budget} MB'))
+            raise StopParsing
+
+    def add_skin(self, obj, bone_names: list[str], created_bones: dict[str, str], bone_ids: list[list[int]], bone_weights: list[list[float]]):
+        vertex_groups = {bone_name: obj.vertex_groups.new(name=bone_name) for bone_name in created_bones}
+        for vertex_idx, (vertex_bone_ids, vertex_bone_weights) in enumerate(zip(bone_ids, bone_weights)):
+            for bone_idx, bone_weight in zip(vertex_bone_ids, vertex_bone_weights):
+                vertex_group = vertex_groups.get(bone_names[int(bone_idx)])
+                if vertex_group is not None:
+                    vertex_group.add([vertex_idx], bone_weight, 'REPLACE')
+
+        armature_mod = obj.modifiers.new('Skeleton', 'ARMATURE')
+        armature_mod.object = self.armature_obj
+
+    def proxy_cache_key(self, filepath: pathlib.Path, global_matrix) -> tuple:
+        return (
+            str(filepath), filepath.stat().st_mtime,
+            tuple(tuple(row) for row in global_matrix),
+            self.proxy_resolution, self.enable_vertex_automerge, self.vertex_position_merge_threshold,
+        )
+
+    def has_proxy(self, cache_key: tuple) -> bool:
+        return cache_key in PROXY_CACHE or cache_key in self.proxy_futures
+
+    def queue_proxy(self, cache_key: tuple, proxy_args: tuple, bone_ids, bone_weights, obj, bone_names, created_bones):
+        """Schedule the decimation of a mesh. `proxy_args` may be empty if `has_proxy` was true before reading it."""
+        future = self.proxy_futures.get(cache_key)
+        if future is None:
+            if cache_key in PROXY_CACHE:
+                future = concurrent.futures.Future()
+                future.set_result(PROXY_CACHE[cache_key])
+            else:
+                if self.proxy_executor is None:
+                    self.proxy_executor = concurrent.futures.ThreadPoolExecutor()
+                future = self.proxy_executor.submit(build_proxy, *proxy_args, self.proxy_resolution)
+            self.proxy_futures[cache_key] = future
+        self.pending_proxies.append((cache_key, future, bone_ids, bone_weights, obj, bone_names, created_bones))
+
+    def build_proxies(self):
+        """Create viewport proxies for the meshes decimated in the background.
+        The full meshes are kept for rendering, the collection switch decides which one the viewport shows."""
+        use_proxy = bpy.data.collections['Collection'].gladius_use_proxy
+        for cache_key, future, bone_ids, bone_weights, obj, bone_names, created_bones in self.pending_proxies:
+            proxy = future.result()
+            if cache_key not in PROXY_CACHE:
+                if len(PROXY_CACHE) >= PROXY_CACHE_SIZE:
+                    PROXY_CACHE.pop(next(iter(PROXY_CACHE)))
+                PROXY_CACHE[cache_key] = proxy
+            proxy_mesh = bpy.data.meshes.new(f'{obj.name}_proxy')
+            fill_mesh(proxy_mesh, proxy.positions, proxy.faces)
+            uv_layer = proxy_mesh.uv_layers.new()
+            uv_layer.data.foreach_set('uv', proxy.uvs)
+            for material in obj.data.materials:
+                proxy_mesh.materials.append(material)
+            proxy_obj = bpy.data.objects.new(f'{obj.name}_proxy', proxy_mesh)
+            proxy_obj.parent = self.armature_obj
+            proxy_obj.hide_render = True
+            self.add_skin(
+                proxy_obj, bone_names, created_bones,
+                [bone_ids[i] for i in proxy.representatives],
+                [bone_weights[i] for i in proxy.representatives],
+            )
+            bpy.data.collections['Collection'].objects.link(proxy_obj)
+            obj['gladius_proxy'] = proxy_obj
+            obj.hide_viewport = use_proxy
+            proxy_obj.hide_viewport = not use_proxy
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop proxy decimation and drop unfinished work. The loader can still be used afterwards."""
+        self.pending_proxies = []
+        self.proxy_futures = {}
+        if self.proxy_executor is not None:
+            self.proxy_executor.shutdown(cancel_futures=True)
+            self.proxy_executor = None
+
+    def load_animations(self, name: str, filename: str, count: int | str = None, suffix: str = ''):
+        for anim_name, anim_path in animation_files(self.data_root, name, filename, count, suffix):
+            self.load_anm_file(anim_name, anim_path)
 
     def load_anm_file(self, name: str, filepath: pathlib.Path):
         if not filepath.exists():
@@ -365,63 +908,33 @@ class UnitLoader:
 
     def load_unit(self, filepath: pathlib.Path):
         root = self.read_xml(filepath, 'unit')
-        loaded_animations = {}
-        animation_suffixes = []
-        for unit in root.find('model'):
-            material = self.load_material(self.data_root / 'Video/Materials' / unit.get('material'))
-            unit_name = unit.get('mesh')
-            self.load_mesh(unit_name, material)
-            idle_animation_path = unit.get('idleAnimation')
-            if idle_animation_path:
-                self.load_animations('idle', idle_animation_path, unit.get('idleAnimationCount'))
-                loaded_animations[idle_animation_path] = 'idle', unit.get('idleAnimationCount')
-        for weapons in root.iterfind('weapons'):
-            for weapon in weapons.iterfind('weapon'):
-                for model in weapon.iterfind('model'):
-                    for weapon_type in model:
-                        material_path = weapon_type.get('material')
-                        mesh_path = weapon_type.get('mesh')
-                        if mesh_path is None:
-                            continue
-                        parent_bone_name = weapon_type.get('bone')
-                        if parent_bone_name:
-                            parent_bone = self.armature.bones[parent_bone_name]
-                        else:
-                            parent_bone = None
-                        if mesh_path and material_path:
-                            material = self.load_material(self.data_root / 'Video/Materials' / material_path)
-                            self.load_mesh(mesh_path, material, parent_bone=parent_bone)
-                            animation_suffix = weapon_type.get('animationSuffix')
-                            if animation_suffix:
-                                animation_suffixes.append(animation_suffix)
-        for actions_root in root.iterfind('actions'):
-            for action in actions_root:
-                for model in action.iterfind('model'):
-                    extra_actions = []
-                    for action_inner in model.iterfind('action'):
-                        for key, animation_path in action_inner.attrib.items():
-                            if not key.lower().endswith('animation'):
-                                continue
-                            if animation_path in loaded_animations:
-                                continue
-                            suffix = key[:-len('animation')]
-                            animation_name, animation_count = f'{action.tag}{suffix[:1].upper()}{suffix[1:]}', action_inner.get(f'{key}Count')
-                            self.load_animations(animation_name, animation_path, animation_count)
-                            loaded_animations[animation_path] = animation_name, animation_count
-                            for suffix in ('Move', 'Levitate'):
-                                if animation_path.lower().endswith(suffix.lower()):
-                                    extra_actions.append((f'{animation_name}Begin', f'{animation_path}Begin', 1))
-                                    extra_actions.append((f'{animation_name}End', f'{animation_path}End', 1))
-                                    break
-                    for anim_name, anim_path, animation_count in extra_actions:
-                        if not (self.data_root / 'Video/Animations' / f'{anim_path}.anm').exists():
-                            continue
-                        self.load_animations(anim_name, anim_path, animation_count)
-                        loaded_animations[anim_path] = anim_name, animation_count
-
-        for suffix in animation_suffixes:
-            for path, (name, cnt) in loaded_animations.items():
-                self.load_animations(name, path, cnt, suffix=suffix)
+        plan = plan_unit(self.data_root, root, self.filters)
+        timings = {}
+
+        def timed(kind: str, size: int, func, *args, **kwargs):
+            start = time.perf_counter()
+            res = func(*args, **kwargs)
+            timing = timings.setdefault(kind, [0, 0.0])
+            timing[0] += size
+            timing[1] += time.perf_counter() - start
+            return res
+
+        for mesh_path, material_path, parent_bone_name, animations in plan.meshes:
+            material_size = sum(file_size(p) for p in material_files(self.data_root, material_path))
+            material = timed('material', material_size, self.load_material, material_path)
+            parent_bone = self.armature.bones[parent_bone_name] if parent_bone_name else None
+            timed('mesh', file_size(mesh_path), self.load_msh_file, mesh_path, material, parent_bone=parent_bone)
+            for animation_name, animation_path in animations:
+                timed('animation', file_size(animation_path), self.load_anm_file, animation_name, animation_path)
+        for animation_name, animation_path in plan.animations:
+            timed('animation', file_size(animation_path), self.load_anm_file, animation_name, animation_path)
+        for kind, (size, seconds) in timings.items():
+            if size:
+                IMPORT_RATES[kind] = seconds / size
+        skipped_cnt = sum(len(files) for files in plan.skipped.values())
+        if skipped_cnt:
+            self.messages.append(('INFO', f'Import filters skipped {skipped_cnt} meshes, materials and animations'))
+        self.build_proxies()
         bpy.ops.object.mode_set(mode='EDIT', toggle=True)
         for bone in self.armature_obj.pose.bones:
             bone.matrix_basis = mathutils.Matrix()